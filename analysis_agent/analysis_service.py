@@ -1,17 +1,45 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 from typing import List
+from collections import OrderedDict
+import hashlib
 import logging
+import os
 
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import SentenceTransformer
+import numpy as np
+import simsimd
 import torch
 
-app = FastAPI(title="RAG-Based Semantic Analysis Agent")
+app = FastAPI(title="RAG-Based Semantic Analysis Agent", default_response_class=ORJSONResponse)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 logging.basicConfig(level=logging.INFO)
 
-# Load pre-trained sentence transformer model
-model = SentenceTransformer('all-MiniLM-L6-v2')
+# Batch cosine is a GEMV — for big chunk lists a GPU beats the CPU path easily,
+# so offload when CUDA is around (overridable via ANALYSIS_DEVICE)
+DEVICE = os.getenv("ANALYSIS_DEVICE", "cuda" if torch.cuda.is_available() else "cpu")
+GPU_BATCH_THRESHOLD = 256  # below this, transfer overhead outweighs the speedup
+
+# Load pre-trained sentence transformer model (inference only, no autograd needed).
+# The ONNX Runtime backend uses fused CPU kernels, well ahead of fp32 PyTorch here.
+# Pinned to CPU: requirements ship the CPU onnxruntime wheels, so constructing
+# this model on cuda would crash at import on GPU hosts
+model = SentenceTransformer('all-MiniLM-L6-v2', backend="onnx", device="cpu")
+
+# The large-batch GPU branch uses a separate torch-backend model, loaded
+# lazily so CPU-only hosts never pay for it
+_gpu_model = None
+
+
+def _get_gpu_model() -> SentenceTransformer:
+    global _gpu_model
+    if _gpu_model is None:
+        _gpu_model = SentenceTransformer('all-MiniLM-L6-v2', device=DEVICE)
+        _gpu_model.eval()
+    return _gpu_model
 
 # ----------------------------
 # Data Models
@@ -29,16 +57,67 @@ class AnalyzeResponse(BaseModel):
 # Helper Functions
 # ----------------------------
 
+# Chunk-embedding LRU: the orchestrator usually re-sends chunks from the same
+# indexed corpus, so most /analyze calls only need to encode the odd miss
+_CHUNK_EMB_CACHE: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+_CHUNK_EMB_CACHE_MAX = 4096
+
+def embed_chunks_cached(chunks: List[str]) -> np.ndarray:
+    """Return normalized embeddings for chunks, encoding only cache misses."""
+    keys = [hashlib.blake2b(chunk.encode("utf-8"), digest_size=16).digest() for chunk in chunks]
+    embeddings = [None] * len(chunks)
+    misses = []
+    miss_positions = []
+
+    for i, key in enumerate(keys):
+        cached = _CHUNK_EMB_CACHE.get(key)
+        if cached is not None:
+            _CHUNK_EMB_CACHE.move_to_end(key)
+            embeddings[i] = cached
+        else:
+            misses.append(chunks[i])
+            miss_positions.append(i)
+
+    if misses:
+        fresh = model.encode(misses, convert_to_numpy=True, normalize_embeddings=True, batch_size=64)
+        for position, embedding in zip(miss_positions, fresh):
+            _CHUNK_EMB_CACHE[keys[position]] = embedding
+            embeddings[position] = embedding
+        while len(_CHUNK_EMB_CACHE) > _CHUNK_EMB_CACHE_MAX:
+            _CHUNK_EMB_CACHE.popitem(last=False)
+
+    return np.vstack(embeddings)
+
 def rank_chunks_by_query_similarity(chunks: List[str], query: str, top_k: int = 3) -> List[str]:
     if not chunks:
         return []
 
-    query_embedding = model.encode(query, convert_to_tensor=True)
-    chunk_embeddings = model.encode(chunks, convert_to_tensor=True)
+    k = min(top_k, len(chunks))
 
-    # Compute cosine similarities between the query and each chunk
-    cosine_scores = util.cos_sim(query_embedding, chunk_embeddings)[0]
-    top_indices = torch.topk(cosine_scores, k=min(top_k, len(chunks))).indices
+    if DEVICE != "cpu" and len(chunks) >= GPU_BATCH_THRESHOLD:
+        # GPU path: keep embeddings on-device and score them with one matmul
+        embeddings = _get_gpu_model().encode(
+            [query] + chunks,
+            convert_to_tensor=True,
+            normalize_embeddings=True,
+            batch_size=64,
+            device=DEVICE,
+        )
+        cosine_scores = embeddings[1:] @ embeddings[0]
+        top_indices = torch.topk(cosine_scores, k=k).indices.tolist()
+        return [chunks[i] for i in top_indices]
+
+    # Chunks come from the embedding cache; only the query (and any misses)
+    # hit the encoder
+    query_embedding = model.encode([query], convert_to_numpy=True, normalize_embeddings=True)
+    chunk_embeddings = embed_chunks_cached(chunks)
+
+    # SimSIMD's SIMD cosine kernel skips PyTorch dispatch overhead, which dominates
+    # for the few dozen 384-dim vectors a typical request carries
+    distances = np.asarray(simsimd.cdist(query_embedding, chunk_embeddings, metric="cosine"))[0]
+
+    top_indices = np.argpartition(distances, k - 1)[:k]
+    top_indices = top_indices[np.argsort(distances[top_indices])]
 
     # Select top-k most relevant chunks
     top_chunks = [chunks[i] for i in top_indices]
@@ -69,3 +148,8 @@ def analyze(request: AnalyzeRequest):
     summary = summarize_chunks(top_chunks, request.query)
 
     return AnalyzeResponse(analysis=summary, top_chunks=top_chunks)
+
+
+@app.get("/health")
+async def health_check():
+    return {"status": "ok"}
@@ -1,10 +1,16 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 from typing import List, Dict, Any
+import asyncio
+import pandas as pd
 import requests
 import yfinance as yf
 import logging
 import os
+import redis
+from collections import OrderedDict
 from dotenv import load_dotenv
 
 # -----------------------------
@@ -18,7 +24,21 @@ logging.basicConfig(filename=LOG_FILE, level=logging.INFO, format='%(asctime)s %
 # -----------------------------
 # FastAPI Init
 # -----------------------------
-app = FastAPI(title="API Service - Dynamic Finance Lookup")
+app = FastAPI(title="API Service - Dynamic Finance Lookup", default_response_class=ORJSONResponse)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# -----------------------------
+# Ticker Cache (LRU + Redis)
+# -----------------------------
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+TICKER_CACHE_TTL = 7 * 24 * 3600  # 7 days
+
+try:
+    redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    redis_client.ping()
+except Exception as e:
+    logging.warning(f"Redis unavailable, ticker cache is in-process only: {e}")
+    redis_client = None
 
 # -----------------------------
 # Request Models
@@ -29,7 +49,48 @@ class CompanyRequest(BaseModel):
 # -----------------------------
 # Helper Functions
 # -----------------------------
+# Manual LRU rather than functools.lru_cache: failed lookups return None and
+# must NOT be memoized, or one transient Yahoo error would pin "no ticker"
+# for that company for the process lifetime
+_TICKER_LRU: OrderedDict = OrderedDict()
+_TICKER_LRU_MAX = 1024
+
+
 def search_company_ticker(company_name: str) -> str:
+    """
+    Resolve a company name to its ticker, consulting the LRU and Redis caches
+    before hitting the Yahoo Finance search endpoint. Only successful
+    resolutions are cached.
+    """
+    lru_key = company_name.lower()
+    cached = _TICKER_LRU.get(lru_key)
+    if cached is not None:
+        _TICKER_LRU.move_to_end(lru_key)
+        return cached
+
+    cache_key = f"ticker:{lru_key}"
+    symbol = None
+    if redis_client is not None:
+        try:
+            symbol = redis_client.get(cache_key)
+        except Exception as e:
+            logging.warning(f"Redis read failed for ticker cache: {e}")
+
+    if not symbol:
+        symbol = _search_company_ticker(company_name)
+        if symbol and redis_client is not None:
+            try:
+                redis_client.setex(cache_key, TICKER_CACHE_TTL, symbol)
+            except Exception as e:
+                logging.warning(f"Redis write failed for ticker cache: {e}")
+
+    if symbol:
+        _TICKER_LRU[lru_key] = symbol
+        while len(_TICKER_LRU) > _TICKER_LRU_MAX:
+            _TICKER_LRU.popitem(last=False)
+    return symbol
+
+def _search_company_ticker(company_name: str) -> str:
     """
     Search Yahoo Finance and return the best-matching ticker symbol for a company name.
     """
@@ -51,42 +112,69 @@ def search_company_ticker(company_name: str) -> str:
         if data.get("quotes"):
             top_result = data["quotes"][0]
             symbol = top_result.get("symbol")
-            longname = top_result.get("longname", "")
-            exch = top_result.get("exchange", "")
-            print(f"✅ Found: {longname} → {symbol} ({exch})")
+            # Lazy %s formatting: the string is only built if the level is enabled
+            logging.debug("Found: %s -> %s (%s)", top_result.get("longname", ""),
+                          symbol, top_result.get("exchange", ""))
             return symbol
 
-        print("❌ No matching ticker found.")
+        logging.debug("No matching ticker found for %s", company_name)
         return None
 
     except Exception as e:
-        print(f"⚠️ Error during search: {e}")
+        logging.warning("Error during ticker search: %s", e)
         return None
 
-def fetch_yfinance_data(ticker: str) -> List[Dict[str, Any]]:
-    try:
-        ticker_obj = yf.Ticker(ticker)
-        hist = ticker_obj.history(period="7d")
-
-        if hist.empty:
-            raise HTTPException(status_code=404, detail=f"No historical data for ticker {ticker}")
+def _ticker_frame(df: pd.DataFrame, ticker: str) -> pd.DataFrame:
+    """
+    Select one ticker's OHLCV columns regardless of yfinance's column shape.
 
-        return [{
-            "date": date.strftime("%Y-%m-%d"),
-            "open": round(row["Open"], 2),
-            "high": round(row["High"], 2),
-            "low": round(row["Low"], 2),
-            "close": round(row["Close"], 2),
-            "volume": int(row["Volume"]),
-        } for date, row in hist.tail(5).iterrows()]
+    With group_by="ticker" recent yfinance returns a ("AAPL", "Open")-style
+    MultiIndex even for a single symbol, while older versions flatten the
+    columns when only one ticker was requested.
+    """
+    if isinstance(df.columns, pd.MultiIndex):
+        return df[ticker]
+    return df
 
+def fetch_bulk_history(tickers: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Fetch 7-day history for all tickers in one yf.download call, letting
+    yfinance's own thread pool parallelize the per-ticker requests.
+    """
+    histories = {}
+    try:
+        df = yf.download(
+            tickers=" ".join(tickers),
+            period="7d",
+            group_by="ticker",
+            threads=True,
+            progress=False,
+        )
     except Exception as e:
-        logging.error(f"Failed to fetch data for {ticker}: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        logging.error(f"Bulk history download failed for {tickers}: {str(e)}")
+        return histories
 
-def get_company_metadata(ticker: str) -> Dict[str, str]:
+    for ticker in tickers:
+        try:
+            hist = _ticker_frame(df, ticker)
+            hist = hist.dropna(how="all")
+            if hist.empty:
+                continue
+            histories[ticker] = [{
+                "date": date.strftime("%Y-%m-%d"),
+                "open": round(row["Open"], 2),
+                "high": round(row["High"], 2),
+                "low": round(row["Low"], 2),
+                "close": round(row["Close"], 2),
+                "volume": int(row["Volume"]),
+            } for date, row in hist.tail(5).iterrows()]
+        except Exception as e:
+            logging.error(f"Failed to extract history for {ticker}: {str(e)}")
+    return histories
+
+def get_company_metadata(ticker_obj: yf.Ticker) -> Dict[str, str]:
     try:
-        info = yf.Ticker(ticker).info
+        info = ticker_obj.info
         return {
             "region": info.get("region", "Unknown"),
             "sector": info.get("sector", "Unknown"),
@@ -98,26 +186,45 @@ def get_company_metadata(ticker: str) -> Dict[str, str]:
 # Endpoint
 # -----------------------------
 @app.post("/get-company-financials")
-def get_company_financials(request: CompanyRequest):
+async def get_company_financials(request: CompanyRequest):
+    # Resolve every name to a ticker first (cached + concurrent)
+    tickers = await asyncio.gather(
+        *[asyncio.to_thread(search_company_ticker, name) for name in request.companies]
+    )
+    resolved = list(zip(request.companies, tickers))
+    valid_tickers = [ticker for _, ticker in resolved if ticker]
+
+    histories: Dict[str, List[Dict[str, Any]]] = {}
+    metadatas: Dict[str, Dict[str, str]] = {}
+    if valid_tickers:
+        # yf.Tickers shares one HTTPS session across the metadata lookups
+        ticker_group = yf.Tickers(" ".join(valid_tickers))
+        history_task = asyncio.to_thread(fetch_bulk_history, valid_tickers)
+        metadata_tasks = [
+            asyncio.to_thread(get_company_metadata, ticker_group.tickers[ticker.upper()])
+            for ticker in valid_tickers
+        ]
+        histories, *metadata_list = await asyncio.gather(history_task, *metadata_tasks)
+        metadatas = dict(zip(valid_tickers, metadata_list))
+
     results = []
-    for name in request.companies:
-        try:
-            ticker = search_company_ticker(name)
-            history = fetch_yfinance_data(ticker)
-            metadata = get_company_metadata(ticker)
-            results.append({
-                "company_name": name,
-                "ticker": ticker,
-                "region": metadata["region"],
-                "sector": metadata["sector"],
-                "history": history
-            })
-        except HTTPException as he:
-            logging.error(f"Error for {name}: {he.detail}")
-            results.append({
-                "company_name": name,
-                "error": he.detail
-            })
+    for name, ticker in resolved:
+        if not ticker:
+            logging.error(f"Error for {name}: no matching ticker found")
+            results.append({"company_name": name, "error": "No matching ticker found."})
+            continue
+        if ticker not in histories:
+            logging.error(f"Error for {name}: no historical data for ticker {ticker}")
+            results.append({"company_name": name, "error": f"No historical data for ticker {ticker}"})
+            continue
+        metadata = metadatas.get(ticker, {"region": "Unknown", "sector": "Unknown"})
+        results.append({
+            "company_name": name,
+            "ticker": ticker,
+            "region": metadata["region"],
+            "sector": metadata["sector"],
+            "history": histories[ticker]
+        })
     return {"status": "success", "company_data": results}
 
 
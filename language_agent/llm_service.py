@@ -1,25 +1,54 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
+from contextlib import asynccontextmanager
 import datetime
 import logging
 import os
 import json
+import hashlib
 import re
-import requests
+import httpx
+import redis.asyncio as aioredis
 import spacy
 from dotenv import load_dotenv
 
 load_dotenv()
-nlp = spacy.load("en_core_web_sm")
+# clean_narrative only needs sentence boundaries, so skip tok2vec (the CNN
+# encoder that dominates the pipeline's CPU cost) along with the tagger/parser/
+# NER components and use the rule-based sentencizer
+nlp_sents = spacy.load("en_core_web_sm", disable=["tok2vec", "tagger", "parser", "ner", "lemmatizer", "attribute_ruler"])
+nlp_sents.add_pipe("sentencizer")
+# The initial-brief path needs NER as well; giving that pipeline a sentencizer
+# lets one pass produce both sentence boundaries and ORG entities
+nlp_ner = spacy.load("en_core_web_sm", disable=["parser", "lemmatizer"])
+nlp_ner.add_pipe("sentencizer", first=True)
 
 # Setup logging
 LOG_FILE = "../logs/usage_logs.json"
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 logging.basicConfig(filename=LOG_FILE, level=logging.INFO, format='%(asctime)s %(message)s')
 
+# Shared async HTTP client so OpenRouter calls reuse one connection pool
+# and never block the event loop
+_ASYNC_CLIENT = httpx.AsyncClient(timeout=60)
+
+# Response cache: a Redis GET is ~0.5ms vs seconds (and token cost) per LLM call
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+LLM_CACHE_TTL = 86400  # 24 hours
+_REDIS = aioredis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    await _ASYNC_CLIENT.aclose()
+    await _REDIS.aclose()
+
 # Initialize FastAPI app
-app = FastAPI(title="LLM Service (Mistral via OpenRouter)")
+app = FastAPI(title="LLM Service (Mistral via OpenRouter)", lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 # Environment
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
@@ -36,6 +65,19 @@ HEADERS = {
     "X-Title": "Financial Assistant"
 }
 
+# Precompiled patterns for clean_narrative — compiled once at import instead of
+# re-hashing the same ~10 patterns on every call
+_RE_MARKDOWN = re.compile(r"[_*~]+")
+_RE_DIGIT_ALPHA = re.compile(r'(\d)([A-Za-z])')
+_RE_ALPHA_DIGIT = re.compile(r'([A-Za-z])(\d)')
+_RE_LOWER_UPPER = re.compile(r'([a-z])([A-Z])')
+_RE_VERTICAL_TEXT = re.compile(r'((?:[a-zA-Z]\n){5,})')
+_RE_NEWLINES = re.compile(r'\n+')
+_RE_MULTI_SPACE = re.compile(r'\s{2,}')
+_RE_SPACE_BEFORE_PUNCT = re.compile(r'\s([.,!?;:])')
+_RE_PUNCT_NO_SPACE = re.compile(r'([.,!?;:])(?=\S)')
+_RE_NUM_SPACE_SYMBOL = re.compile(r'(\d)\s(%|\$)')
+
 # Schemas
 class InitialBriefRequest(BaseModel):
     raw_text: str
@@ -52,35 +94,37 @@ class FinalNarrativeResponse(BaseModel):
     narrative: str
 
 def clean_narrative(text: str) -> str:
+    final, _doc = _clean_text(text, nlp_sents)
+    return final
+
+def clean_and_extract_companies(text: str) -> tuple:
+    """Clean the text and pull ORG entities from the same spaCy pass."""
+    final, doc = _clean_text(text, nlp_ner)
+    companies = list(set(ent.text for ent in doc.ents if ent.label_ == "ORG")) if doc is not None else []
+    return final, companies
+
+def _clean_text(text: str, pipeline):
     if not text or not isinstance(text, str):
-        return ""
-    
+        return "", None
+
     # Step 1: Remove markdown artifacts
-    text = re.sub(r"[_*~]+", "", text)
+    text = _RE_MARKDOWN.sub("", text)
 
     # Step 2: Fix number/letter joins (light touch) - This is the most critical for your issue
-    text = re.sub(r'(\d)([A-Za-z])', r'\1 \2', text)
-    text = re.sub(r'([A-Za-z])(\d)', r'\1 \2', text)
-    text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text)
-
-    # Additional aggressive cleaning for concatenated words
-    # This pattern looks for a lowercase letter followed by an uppercase letter without a space,
-    # or a sequence of letters followed by digits without a space.
-    # It attempts to insert a space. This might need fine-tuning.
-    text = re.sub(r'([a-z])([A-Z])', r'\1 \2', text) # Already there, but emphasized.
-    text = re.sub(r'([a-zA-Z])(\d)', r'\1 \2', text) # letters followed by digits
-    text = re.sub(r'(\d)([a-zA-Z])', r'\1 \2', text) # digits followed by letters
+    text = _RE_DIGIT_ALPHA.sub(r'\1 \2', text)
+    text = _RE_ALPHA_DIGIT.sub(r'\1 \2', text)
+    text = _RE_LOWER_UPPER.sub(r'\1 \2', text)
 
     # Step 3: Remove vertical text artifacts
-    text = re.sub(r'((?:[a-zA-Z]\n){5,})', lambda m: m.group(0).replace('\n', ''), text)
+    text = _RE_VERTICAL_TEXT.sub(lambda m: m.group(0).replace('\n', ''), text)
 
     # Step 4: Normalize spacing and line breaks
-    text = re.sub(r'\n+', ' ', text)
-    text = re.sub(r'\s{2,}', ' ', text)
+    text = _RE_NEWLINES.sub(' ', text)
+    text = _RE_MULTI_SPACE.sub(' ', text)
     text = text.strip()
 
-    # Step 5: Run through spaCy
-    doc = nlp(text)
+    # Step 5: Run through spaCy (whichever pipeline the caller needs)
+    doc = pipeline(text)
     cleaned_sentences = []
 
     for sent in doc.sents:
@@ -90,23 +134,19 @@ def clean_narrative(text: str) -> str:
         # Capitalize first character safely
         sentence = sentence[0].upper() + sentence[1:] if len(sentence) > 1 else sentence.upper()
         # Fix punctuation spacing
-        sentence = re.sub(r'\s([.,!?;:])', r'\1', sentence)
-        sentence = re.sub(r'([.,!?;:])(?=\S)', r'\1 ', sentence)
+        sentence = _RE_SPACE_BEFORE_PUNCT.sub(r'\1', sentence)
+        sentence = _RE_PUNCT_NO_SPACE.sub(r'\1 ', sentence)
         cleaned_sentences.append(sentence)
 
     # Step 6: Join back and extra formatting
     final = ' '.join(cleaned_sentences)
-    final = re.sub(r'\s{2,}', ' ', final)
-    final = re.sub(r'(\d)\s(%|\$)', r'\1\2', final)  # Remove space in "50 %" or "100 $"
+    final = _RE_MULTI_SPACE.sub(' ', final)
+    final = _RE_NUM_SPACE_SYMBOL.sub(r'\1\2', final)  # Remove space in "50 %" or "100 $"
 
-    return final.strip()
+    return final.strip(), doc
 
 
 # Utility functions
-def extract_company_names(text: str) -> List[str]:
-    doc = nlp(text)
-    return list(set(ent.text for ent in doc.ents if ent.label_ == "ORG"))
-
 def build_initial_prompt(raw_text: str) -> str:
     today = datetime.datetime.now().strftime("%A, %d %B %Y")
     return (
@@ -131,7 +171,7 @@ def build_final_prompt(context: List[str], analysis: Optional[str] = None) -> st
         prompt += f"\nAnalytical Summary: {analysis.strip()}\n"
     return prompt
 
-def call_openrouter(prompt: str) -> str:
+async def call_openrouter(prompt: str) -> str:
     messages = [
         {"role": "system", "content": "You are a helpful financial assistant. Ensure your output is clean, readable, and free of concatenated words, especially around numbers and symbols, for text-to-speech conversion."}, # Added instruction to system prompt
         {"role": "user", "content": prompt}
@@ -141,7 +181,16 @@ def call_openrouter(prompt: str) -> str:
         "messages": messages,
         "max_tokens": 200
     }
-    response = requests.post(OPENROUTER_URL, headers=HEADERS, json=payload)
+
+    cache_key = "llm:" + hashlib.sha256((MODEL_NAME + prompt).encode("utf-8")).hexdigest()
+    try:
+        cached = await _REDIS.get(cache_key)
+        if cached:
+            return cached
+    except Exception as e:
+        logging.warning(f"Redis read failed for LLM cache: {e}")
+
+    response = await _ASYNC_CLIENT.post(OPENROUTER_URL, headers=HEADERS, json=payload)
 
     if response.status_code != 200:
         logging.error(f"OpenRouter API error [{response.status_code}]: {response.text}")
@@ -153,6 +202,10 @@ def call_openrouter(prompt: str) -> str:
         try:
             response_data = response.json()
             llm_output = response_data["choices"][0]["message"]["content"]
+            try:
+                await _REDIS.setex(cache_key, LLM_CACHE_TTL, llm_output)
+            except Exception as e:
+                logging.warning(f"Redis write failed for LLM cache: {e}")
             return llm_output
         except KeyError as e:
             logging.error(f"Failed to parse OpenRouter response: Missing key {e} in {response.text}")
@@ -167,13 +220,11 @@ def call_openrouter(prompt: str) -> str:
 async def generate_initial_brief(data: InitialBriefRequest):
     try:
         prompt = build_initial_prompt(data.raw_text)
-        response_text = call_openrouter(prompt)
-        
-        # Apply cleaning to the brief before processing and returning
-        cleaned_brief = clean_narrative(response_text) # <-- Apply clean_narrative here
-        
-        company_names = extract_company_names(cleaned_brief) # Extract from cleaned brief
+        response_text = await call_openrouter(prompt)
         
+        # One spaCy pass cleans the brief and extracts the companies
+        cleaned_brief, company_names = clean_and_extract_companies(response_text)
+
         logging.info(json.dumps({
             "event": "initial_brief",
             "input_chars": len(data.raw_text),
@@ -189,7 +240,7 @@ async def generate_initial_brief(data: InitialBriefRequest):
 async def generate_final_narrative(data: FinalNarrativeRequest):
     try:
         prompt = build_final_prompt(data.context_chunks, data.analysis_summary)
-        narrative = call_openrouter(prompt)
+        narrative = await call_openrouter(prompt)
         cleaned_narrative = clean_narrative(narrative)
         logging.info(json.dumps({
             "event": "final_narrative",
@@ -1,10 +1,29 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import APIRouter, Request, UploadFile, File, Form, HTTPException
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from contextlib import asynccontextmanager
+import asyncio
 import httpx
 import logging
 from fastapi import FastAPI
 
-app = FastAPI(title="Orchestrator Service")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One shared client for the process lifetime, so downstream hops reuse
+    # keep-alive connections instead of paying a TCP handshake per call
+    app.state.client = httpx.AsyncClient(
+        timeout=60,
+        limits=httpx.Limits(max_keepalive_connections=64),
+    )
+    yield
+    await app.state.client.aclose()
+
+
+# No GZipMiddleware here: the orchestrator's big responses are proxied MP3
+# streams, and Starlette gzips streaming bodies regardless of minimum_size —
+# burning CPU on already-compressed audio and buffering away the small early
+# chunks that make time-to-first-audio fast. The JSON agents keep their gzip.
+app = FastAPI(title="Orchestrator Service", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 
 # Microservice endpoints
@@ -20,6 +39,7 @@ logging.basicConfig(level=logging.INFO)
 
 @app.post("/process/")
 async def process_request(
+    request: Request,
     audio_file: UploadFile | None = File(default=None),
     input_text: str | None = Form(default=None),
     response_mode: str = Form(default="audio"),  # "audio" or "text"
@@ -28,154 +48,166 @@ async def process_request(
     if audio_file is None and (input_text is None or not input_text.strip()):
         raise HTTPException(status_code=400, detail="Provide either audio_file or input_text.")
 
-    async with httpx.AsyncClient(timeout=60) as client:
-
-        # Step 1: STT if needed
-        if audio_file:
-            audio_bytes = await audio_file.read()
-            files = {"file": (audio_file.filename, audio_bytes, audio_file.content_type)}
-            stt_resp = await client.post(STT_URL, files=files)
-            if stt_resp.status_code != 200:
-                raise HTTPException(status_code=502, detail=f"STT error: {stt_resp.text}")
-            input_text = stt_resp.json().get("transcription", "").strip()
-            if not input_text:
-                raise HTTPException(status_code=502, detail="STT returned empty text.")
-            logging.info(f"Transcribed input: {input_text}")
-
-        input_text = input_text.strip()
-        logging.info(f"User query: {input_text}")
-
-        # Step 2: LLM - Generate Brief & Extract Company Names
-        brief_resp = await client.post(LLM_BRIEF_URL, json={"raw_text": input_text})
-        if brief_resp.status_code != 200:
-            raise HTTPException(status_code=502, detail=f"LLM brief error: {brief_resp.text}")
-        
-        brief_data = brief_resp.json()
-        brief = brief_data.get("brief", "").strip()
-        companies = brief_data.get("company_names", [])
-
-        if not brief or not companies:
-            raise HTTPException(status_code=502, detail="LLM brief generation failed or returned empty data.")
-        logging.info(f"Generated brief: {brief}...")
-        logging.info(f"Companies identified: {companies}")
-
-        # Step 3: Call API service with extracted companies
-        if not companies:
-            logging.warning("No companies extracted from LLM.")
-            raise HTTPException(status_code=400, detail="No companies extracted to process.")
-
-        logging.info(f"Companies extracted: {companies}")
-
-        try:
-            api_resp = await client.post(API_SERVICE_URL, json={"companies": companies})
-            logging.info(f"API service response status: {api_resp.status_code}")
-        except Exception as e:
-            logging.error(f"Failed to connect to API service: {e}")
-            raise HTTPException(status_code=502, detail="Failed to connect to Company API service.")
-
-        if api_resp.status_code != 200:
-            logging.error(f"API service error {api_resp.status_code}: {api_resp.text}")
-            raise HTTPException(status_code=502, detail=f"API service error: {api_resp.text}")
-
-        try:
-            company_data = api_resp.json().get("company_data", [])
-        except Exception as e:
-            logging.error(f"Error parsing JSON from API service: {e}")
-            raise HTTPException(status_code=502, detail="Invalid response from Company API.")
-
-        logging.info(f"Company data received: {[entry.get('ticker') for entry in company_data]}")
-
-        for entry in company_data:
-            if not {"company_name", "ticker", "sector", "region", "history"}.issubset(entry.keys()):
-                logging.warning(f"Missing fields in entry: {entry}")
-
-
-        # Step 3.5: Index docs into retriever
-        documents = []
-        for entry in company_data:
-            if "error" in entry:
-                continue
-            doc_str = (
-                f"{entry['company_name']} ({entry['ticker']}), Sector: {entry['sector']}, "
-                f"Region: {entry['region']}. Price history: {entry['history']}"
-            )
-            documents.append(doc_str)
-        index_resp = await client.post(
+    client = request.app.state.client
+
+    # Step 1: STT if needed
+    if audio_file:
+        audio_bytes = await audio_file.read()
+        files = {"file": (audio_file.filename, audio_bytes, audio_file.content_type)}
+        stt_resp = await client.post(STT_URL, files=files)
+        if stt_resp.status_code != 200:
+            raise HTTPException(status_code=502, detail=f"STT error: {stt_resp.text}")
+        input_text = stt_resp.json().get("transcription", "").strip()
+        if not input_text:
+            raise HTTPException(status_code=502, detail="STT returned empty text.")
+        logging.info("Transcribed input: %s", input_text)
+
+    input_text = input_text.strip()
+    logging.info("User query: %s", input_text)
+
+    # Step 2: LLM - Generate Brief & Extract Company Names
+    brief_resp = await client.post(LLM_BRIEF_URL, json={"raw_text": input_text})
+    if brief_resp.status_code != 200:
+        raise HTTPException(status_code=502, detail=f"LLM brief error: {brief_resp.text}")
+    
+    brief_data = brief_resp.json()
+    brief = brief_data.get("brief", "").strip()
+    companies = brief_data.get("company_names", [])
+
+    if not brief or not companies:
+        raise HTTPException(status_code=502, detail="LLM brief generation failed or returned empty data.")
+    logging.info("Generated brief: %.100s...", brief)
+    logging.info("Companies identified: %s", companies)
+
+    # Step 3: Call API service with extracted companies
+    if not companies:
+        logging.warning("No companies extracted from LLM.")
+        raise HTTPException(status_code=400, detail="No companies extracted to process.")
+
+    logging.info("Companies extracted: %s", companies)
+
+    try:
+        api_resp = await client.post(API_SERVICE_URL, json={"companies": companies})
+        logging.info("API service response status: %s", api_resp.status_code)
+    except Exception as e:
+        logging.error("Failed to connect to API service: %s", e)
+        raise HTTPException(status_code=502, detail="Failed to connect to Company API service.")
+
+    if api_resp.status_code != 200:
+        logging.error("API service error %s: %s", api_resp.status_code, api_resp.text)
+        raise HTTPException(status_code=502, detail=f"API service error: {api_resp.text}")
+
+    try:
+        company_data = api_resp.json().get("company_data", [])
+    except Exception as e:
+        logging.error("Error parsing JSON from API service: %s", e)
+        raise HTTPException(status_code=502, detail="Invalid response from Company API.")
+
+    logging.info("Company data received: %s", [entry.get("ticker") for entry in company_data])
+
+    for entry in company_data:
+        if not {"company_name", "ticker", "sector", "region", "history"}.issubset(entry.keys()):
+            logging.warning("Missing fields in entry: %s", entry)
+
+
+    # Step 3.5: Index docs into retriever
+    documents = []
+    for entry in company_data:
+        if "error" in entry:
+            continue
+        doc_str = (
+            f"{entry['company_name']} ({entry['ticker']}), Sector: {entry['sector']}, "
+            f"Region: {entry['region']}. Price history: {entry['history']}"
+        )
+        documents.append(doc_str)
+    # Steps 3.5 + 4 run concurrently: indexing the fresh docs and retrieving
+    # context for the query are independent network hops, so overlapping them
+    # cuts this stage from sum-of-hops to max-of-hops
+    index_resp, retriever_resp = await asyncio.gather(
+        client.post(
             f"{RETRIEVER_URL.replace('/retrieve', '')}/index-docs",
             json={"documents": documents}
+        ),
+        client.post(RETRIEVER_URL, json={"query": input_text, "top_k": 5}),
+    )
+    if index_resp.status_code != 200:
+        raise HTTPException(status_code=502, detail=f"Indexing error: {index_resp.text}")
+    logging.info("Indexed %d documents into retriever", len(documents))
+
+    # Step 4: Retriever - fetch related chunks
+    if retriever_resp.status_code != 200:
+        # On a fresh start the gathered retrieve can race the very indexing
+        # that populates the in-memory store ("No documents indexed yet");
+        # indexing has finished by now, so one retry resolves that case
+        logging.warning("Retriever returned %s; retrying now that indexing is done",
+                        retriever_resp.status_code)
+        retriever_resp = await client.post(RETRIEVER_URL, json={"query": input_text, "top_k": 5})
+    if retriever_resp.status_code != 200:
+        raise HTTPException(status_code=502, detail=f"Retriever error: {retriever_resp.text}")
+    context_chunks = retriever_resp.json().get("chunks", [])
+    logging.info("Retrieved %d context chunks", len(context_chunks))
+
+    # Step 5: Analyzer - extract insights
+    analysis_payload = {
+        "query": input_text,
+        "chunks": context_chunks
+    }
+    analysis_resp = await client.post(ANALYSIS_URL, json=analysis_payload)
+    if analysis_resp.status_code != 200:
+        raise HTTPException(status_code=502, detail=f"Analyzer error: {analysis_resp.text}")
+    analysis_summary = analysis_resp.json().get("analysis", "")
+    logging.info("Analysis summary: %.100s...", analysis_summary)
+
+    # Step 6: LLM - Final Narrative Generation
+    narrative_payload = {
+        "brief": brief,
+        "company_data": company_data,
+        "context_chunks": context_chunks,
+        "analysis_summary": analysis_summary
+    }
+    narrative_resp = await client.post(LLM_NARRATIVE_URL, json=narrative_payload)
+    if narrative_resp.status_code != 200:
+        raise HTTPException(status_code=502, detail=f"Narrative LLM error: {narrative_resp.text}")
+    narrative = narrative_resp.json().get("narrative", "").strip()
+    if not narrative:
+        raise HTTPException(status_code=502, detail="LLM returned empty narrative.")
+    logging.info("Narrative: %.150s...", narrative)
+
+    # Step 7: Return as text or synthesize audio
+    if response_mode == "text":
+        return ORJSONResponse(content={"narrative": narrative})
+
+    # Step 8: TTS
+    logging.info("Calling TTS service at %s to stream audio for brief...", TTS_URL)
+
+    try:
+        # Make the POST request to TTS
+        tts_resp = await client.post(
+            TTS_URL,
+            json={"text": brief, "voice": voice},
+            timeout=None  # Required for streaming
         )
-        if index_resp.status_code != 200:
-            raise HTTPException(status_code=502, detail=f"Indexing error: {index_resp.text}")
-        logging.info(f"Indexed {len(documents)} documents into retriever")
 
-        # Step 4: Retriever - fetch related chunks
-        retriever_resp = await client.post(RETRIEVER_URL, json={"query": input_text, "top_k": 5})
-        if retriever_resp.status_code != 200:
-            raise HTTPException(status_code=502, detail=f"Retriever error: {retriever_resp.text}")
-        context_chunks = retriever_resp.json().get("chunks", [])
-        logging.info(f"Retrieved {len(context_chunks)} context chunks")
-
-        # Step 5: Analyzer - extract insights
-        analysis_payload = {
-            "query": input_text,
-            "chunks": context_chunks
-        }
-        analysis_resp = await client.post(ANALYSIS_URL, json=analysis_payload)
-        if analysis_resp.status_code != 200:
-            raise HTTPException(status_code=502, detail=f"Analyzer error: {analysis_resp.text}")
-        analysis_summary = analysis_resp.json().get("analysis", "")
-        logging.info(f"Analysis summary: {analysis_summary[:100]}...")
-
-        # Step 6: LLM - Final Narrative Generation
-        narrative_payload = {
-            "brief": brief,
-            "company_data": company_data,
-            "context_chunks": context_chunks,
-            "analysis_summary": analysis_summary
-        }
-        narrative_resp = await client.post(LLM_NARRATIVE_URL, json=narrative_payload)
-        if narrative_resp.status_code != 200:
-            raise HTTPException(status_code=502, detail=f"Narrative LLM error: {narrative_resp.text}")
-        narrative = narrative_resp.json().get("narrative", "").strip()
-        if not narrative:
-            raise HTTPException(status_code=502, detail="LLM returned empty narrative.")
-        logging.info(f"Narrative: {narrative[:150]}...")
-
-        # Step 7: Return as text or synthesize audio
-        if response_mode == "text":
-            return JSONResponse(content={"narrative": narrative})
-        
-        file_path = "my_document.txt"
-        with open(file_path, "w") as file:
-            file.write(narrative)
-
-        # Step 8: TTS
-        logging.info(f"Calling TTS service at: {TTS_URL} to stream audio for brief...")
-
-        try:
-            # Make the POST request to TTS
-            tts_resp = await client.post(
-                TTS_URL,
-                json={"text": brief, "voice": voice},
-                timeout=None  # Required for streaming
-            )
-
-            if tts_resp.status_code != 200:
-                # Try to parse any error detail for logging and debugging
-                try:
-                    error_detail = (await tts_resp.aread()).decode()
-                except Exception:
-                    error_detail = "Unknown error"
-                logging.error(f"TTS error: Status {tts_resp.status_code}, Detail: {error_detail}")
-                raise HTTPException(status_code=502, detail=f"TTS service returned error {tts_resp.status_code}: {error_detail}")
-
-            logging.info("Returning streaming audio response from TTS service.")
-            return StreamingResponse(tts_resp.aiter_bytes(), media_type="audio/mpeg")
-
-        except httpx.RequestError as e:
-            logging.error(f"TTS service network error: {e}")
-            raise HTTPException(status_code=503, detail=f"Could not connect to TTS service: {e}")
-
-        except Exception as e:
-            logging.error(f"Unexpected error during TTS streaming: {str(e)}", exc_info=True)
-            raise HTTPException(status_code=500, detail="Unexpected error during TTS streaming.")
\ No newline at end of file
+        if tts_resp.status_code != 200:
+            # Try to parse any error detail for logging and debugging
+            try:
+                error_detail = (await tts_resp.aread()).decode()
+            except Exception:
+                error_detail = "Unknown error"
+            logging.error("TTS error: status %s, detail: %s", tts_resp.status_code, error_detail)
+            raise HTTPException(status_code=502, detail=f"TTS service returned error {tts_resp.status_code}: {error_detail}")
+
+        logging.info("Returning streaming audio response from TTS service.")
+        return StreamingResponse(tts_resp.aiter_bytes(), media_type="audio/mpeg")
+
+    except httpx.RequestError as e:
+        logging.error("TTS service network error: %s", e)
+        raise HTTPException(status_code=503, detail=f"Could not connect to TTS service: {e}")
+
+    except Exception as e:
+        logging.error("Unexpected error during TTS streaming: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail="Unexpected error during TTS streaming.")
+
+@app.get("/health")
+async def health_check():
+    return {"status": "ok"}
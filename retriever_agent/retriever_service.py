@@ -1,11 +1,18 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 from typing import List
 from sentence_transformers import SentenceTransformer
+from functools import lru_cache
+import asyncio
 import faiss
+import hashlib
+import threading
 import numpy as np
 import logging
 import os
+import redis
 from uuid import uuid4
 
 # -----------------------------
@@ -18,15 +25,63 @@ logging.basicConfig(filename=LOG_FILE, level=logging.INFO, format='%(asctime)s %
 # -----------------------------
 # FastAPI Init
 # -----------------------------
-app = FastAPI(title="Retriever Agent - FAISS Service")
+app = FastAPI(title="Retriever Agent - FAISS Service", default_response_class=ORJSONResponse)
+app.add_middleware(GZipMiddleware, minimum_size=1024)
 
 # -----------------------------
 # Embedding + FAISS Setup
 # -----------------------------
-embedder = SentenceTransformer('all-MiniLM-L6-v2')
+# ONNX Runtime backend runs the transformer with fused kernels, roughly 2-3x
+# faster than the fp32 PyTorch forward pass on CPU
+embedder = SentenceTransformer('all-MiniLM-L6-v2', backend="onnx")
 dimension = embedder.get_sentence_embedding_dimension()
-index = faiss.IndexFlatL2(dimension)
+# Inner product on normalized embeddings == cosine similarity, at half the FLOPs of L2.
+# HNSW gives sub-linear graph-based search instead of scanning every document per query,
+# and the 8-bit scalar quantizer stores vectors at a quarter of the fp32 footprint.
+index = faiss.IndexHNSWSQ(dimension, faiss.ScalarQuantizer.QT_8bit, 32, faiss.METRIC_INNER_PRODUCT)
+index.hnsw.efConstruction = 80
+index.hnsw.efSearch = 64
 doc_store = []
+# HNSW is not safe for add-during-search: mutating the graph (or training the
+# quantizer) while another thread traverses it can corrupt results or crash,
+# and the orchestrator deliberately overlaps /index-docs with /retrieve
+_index_lock = threading.Lock()
+
+# -----------------------------
+# Embedding Cache (LRU + Redis)
+# -----------------------------
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+EMBED_CACHE_TTL = 7 * 24 * 3600  # 7 days
+
+try:
+    redis_client = redis.Redis.from_url(REDIS_URL)
+    redis_client.ping()
+except Exception as e:
+    logging.warning(f"Redis unavailable, embedding cache is in-process only: {e}")
+    redis_client = None
+
+@lru_cache(maxsize=1024)
+def cached_embed(text: str) -> np.ndarray:
+    """Embed a single text, checking the in-process LRU then Redis before encoding."""
+    key = "emb:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+    if redis_client is not None:
+        try:
+            cached = redis_client.get(key)
+            if cached:
+                return np.frombuffer(cached, dtype=np.float32).reshape(1, -1)
+        except Exception as e:
+            logging.warning(f"Redis read failed for embedding cache: {e}")
+
+    embedding = embedder.encode([text], convert_to_numpy=True, normalize_embeddings=True)
+    embedding = np.ascontiguousarray(embedding, dtype=np.float32)
+
+    if redis_client is not None:
+        try:
+            # Raw float32 bytes keep the payload small and skip JSON overhead
+            redis_client.setex(key, EMBED_CACHE_TTL, embedding.tobytes())
+        except Exception as e:
+            logging.warning(f"Redis write failed for embedding cache: {e}")
+    return embedding
 
 # -----------------------------
 # Request Schemas
@@ -44,9 +99,14 @@ class RetrieveDocsRequest(BaseModel):
 @app.post("/index-docs")
 def index_docs(request: IndexDocsRequest):
     try:
-        embeddings = embedder.encode(request.documents, convert_to_numpy=True)
-        index.add(embeddings)
-        doc_store.extend(request.documents)
+        embeddings = embedder.encode(request.documents, convert_to_numpy=True, normalize_embeddings=True)
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        with _index_lock:
+            # The scalar quantizer needs its per-dimension ranges fitted before the first add
+            if not index.is_trained:
+                index.train(embeddings)
+            index.add(embeddings)
+            doc_store.extend(request.documents)
         logging.info(f"Indexed {len(request.documents)} documents.")
         return {"status": "success", "indexed_docs": len(request.documents)}
     except Exception as e:
@@ -56,26 +116,40 @@ def index_docs(request: IndexDocsRequest):
 # -----------------------------
 # Retrieval Endpoint
 # -----------------------------
-@app.post("/retrieve")
-def retrieve_docs(request: RetrieveDocsRequest):
+# Singleflight map: concurrent identical queries share one embed + search
+_inflight: dict = {}
+
+def _retrieve_sync(query: str, top_k: int):
     try:
-        query_embedding = embedder.encode([request.query], convert_to_numpy=True)
-        if index.ntotal == 0:
-            raise HTTPException(status_code=404, detail="No documents indexed yet.")
+        query_embedding = cached_embed(query)
+        with _index_lock:
+            if index.ntotal == 0:
+                raise HTTPException(status_code=404, detail="No documents indexed yet.")
 
-        D, I = index.search(query_embedding, request.top_k)
-        results = [doc_store[i] for i in I[0] if i < len(doc_store)]
+            D, I = index.search(query_embedding, top_k)
+            len_store = len(doc_store)
+        results = [doc_store[i] for i in I[0] if 0 <= i < len_store]
 
-        logging.info(f"Retrieved {len(results)} documents for query: {request.query}")
+        logging.info(f"Retrieved {len(results)} documents for query: {query}")
         return {
             "status": "success",
-            "query": request.query,
+            "query": query,
             "chunks": results
         }
     except Exception as e:
         logging.error(f"Retrieval failed: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve documents.")
 
+@app.post("/retrieve")
+async def retrieve_docs(request: RetrieveDocsRequest):
+    key = f"{request.query}|{request.top_k}"
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(asyncio.to_thread(_retrieve_sync, request.query, request.top_k))
+        _inflight[key] = task
+        task.add_done_callback(lambda _t, _k=key: _inflight.pop(_k, None))
+    return await task
+
 # -----------------------------
 # Health Check
 # -----------------------------
@@ -1,18 +1,38 @@
 import streamlit as st
 from streamlit_webrtc import webrtc_streamer, WebRtcMode
 import httpx
-import tempfile
+import atexit
 import os
 from io import BytesIO
 import asyncio
-import nest_asyncio
+import numpy as np
+import threading
+import time
 from datetime import datetime
 import json
 
-nest_asyncio.apply()
-
 ORCHESTRATOR_URL = "http://localhost:8000/process/"
 
+@st.cache_resource
+def get_loop():
+    """One persistent event loop on a background thread. Submitting coroutines
+    to it via run_coroutine_threadsafe avoids the nest_asyncio re-entrant
+    run_until_complete dance, which adds overhead to every coroutine step."""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+@st.cache_resource
+def get_client():
+    """One shared async client across reruns, so every submission reuses the
+    orchestrator connection instead of paying a fresh TCP handshake."""
+    client = httpx.AsyncClient(
+        timeout=httpx.Timeout(90.0, connect=5.0),
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30),
+    )
+    atexit.register(lambda: asyncio.run_coroutine_threadsafe(client.aclose(), get_loop()).result(5))
+    return client
+
 # Initialize session state for stats
 if 'total_sessions' not in st.session_state:
     st.session_state.total_sessions = 0
@@ -221,13 +241,9 @@ with tab1:
             try:
                 audio_frames = ctx.audio_receiver.get_frames(timeout=2)
                 if audio_frames:
-                    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmpfile:
-                        for frame in audio_frames:
-                            tmpfile.write(frame.to_ndarray().tobytes())
-                        tmpfile_path = tmpfile.name
-                    with open(tmpfile_path, "rb") as f:
-                        audio_bytes = f.read()
-                    os.unlink(tmpfile_path)
+                    # One C-level concatenate + copy instead of a bytes object per frame
+                    merged = np.concatenate([frame.to_ndarray() for frame in audio_frames], axis=-1)
+                    audio_bytes = merged.tobytes()
                     st.success("✅ Audio captured successfully!")
                 else:
                     st.warning("⏳ Waiting for audio input...")
@@ -292,44 +308,64 @@ with tab2:
             "include_timestamps": include_timestamps
         }
 
-        async def send_request():
-            async with httpx.AsyncClient(timeout=90) as client:
-                if "🎤" in input_mode:
-                    files = {"audio_file": ("query.wav", audio_bytes, "audio/wav")}
-                    resp = await client.post(ORCHESTRATOR_URL, files=files, data=payload)
-                else:
-                    data = {"input_text": input_text, **payload}
-                    resp = await client.post(ORCHESTRATOR_URL, data=data)
+        async def send_request(download):
+            client = get_client()
+            if "🎤" in input_mode:
+                kwargs = {"files": {"audio_file": ("query.wav", audio_bytes, "audio/wav")}, "data": payload}
+            else:
+                kwargs = {"data": {"input_text": input_text, **payload}}
+            # Stream the body instead of buffering it whole inside httpx — the
+            # first audio bytes reach the UI at the orchestrator's first-chunk
+            # latency rather than after the full MP3 is generated
+            buf = BytesIO()
+            async with client.stream("POST", ORCHESTRATOR_URL, **kwargs) as resp:
                 resp.raise_for_status()
-                return resp
+                async for chunk in resp.aiter_bytes(65536):
+                    buf.write(chunk)
+                    download["received"] = buf.tell()
+                    if "first" not in download and buf.tell() >= (1 << 14):
+                        download["first"] = buf.getvalue()
+            return resp, buf.getvalue()
 
         # Progress indicator
         progress_text = st.empty()
         progress_bar = st.progress(0)
-        
+        preview_audio = st.empty()
+
         with st.spinner(""):
             progress_text.text("🔄 Connecting to market data...")
             progress_bar.progress(25)
-            
+
             try:
-                loop = asyncio.get_event_loop()
                 progress_text.text("📡 Processing your request...")
                 progress_bar.progress(50)
-                
-                response = loop.run_until_complete(send_request())
-                
-                progress_text.text("✨ Generating your brief...")
-                progress_bar.progress(75)
-                
+
+                download = {}
+                future = asyncio.run_coroutine_threadsafe(send_request(download), get_loop())
+                preview_shown = False
+                while not future.done():
+                    received = download.get("received")
+                    if received:
+                        progress_bar.progress(75)
+                        progress_text.text(f"⬇️ Receiving your brief... {received // 1024} KB")
+                    if not preview_shown and "first" in download and "📝" not in response_mode:
+                        # Play the opening of the brief while the rest streams in
+                        preview_audio.audio(download["first"], format="audio/mpeg", autoplay=auto_play)
+                        preview_shown = True
+                    time.sleep(0.1)
+                response, body = future.result()
+
                 progress_bar.progress(100)
                 progress_text.text("✅ Complete!")
-                
+
             except Exception as e:
                 st.error(f"❌ Request failed: {e}")
                 if show_debug:
                     st.exception(e)
                 st.stop()
 
+        preview_audio.empty()
+
         # Clear progress indicators
         progress_text.empty()
         progress_bar.empty()
@@ -337,7 +373,7 @@ with tab2:
         # Display results
         if "📝" in response_mode or "🎭" in response_mode:
             try:
-                result = response.json()
+                result = json.loads(body)
                 narrative = result.get("narrative", "")
                 if narrative:
                     st.markdown('<div class="success-box">', unsafe_allow_html=True)
@@ -365,8 +401,8 @@ with tab2:
             if show_debug:
                 st.code(f"Status: {response.status_code}\nHeaders: {response.headers}")
             
-            audio_data = response.content if hasattr(response, 'content') else None
-            
+            audio_data = body
+
             if audio_data and len(audio_data) > 0:
                 st.audio(audio_data, format="audio/mpeg", autoplay=auto_play)
                 
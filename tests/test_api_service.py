@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+pytest.importorskip("fastapi")
+pytest.importorskip("yfinance")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api_agent"))
+import api_service
+
+OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def _history_df(tickers):
+    """Build a yf.download-style frame with ticker-level MultiIndex columns."""
+    dates = pd.date_range("2026-08-24", periods=5)
+    columns = pd.MultiIndex.from_product([tickers, OHLCV])
+    data = [[100.0, 101.0, 99.0, 100.5, 1000] * len(tickers)] * len(dates)
+    return pd.DataFrame(data, index=dates, columns=columns)
+
+
+def test_single_ticker_history(monkeypatch):
+    # Recent yfinance keeps the ticker column level even for one symbol
+    monkeypatch.setattr(api_service.yf, "download",
+                        lambda **kwargs: _history_df(["AAPL"]))
+    histories = api_service.fetch_bulk_history(["AAPL"])
+    assert "AAPL" in histories
+    assert len(histories["AAPL"]) == 5
+    assert histories["AAPL"][0]["open"] == 100.0
+    assert histories["AAPL"][0]["volume"] == 1000
+
+
+def test_single_ticker_history_flat_columns(monkeypatch):
+    # Older yfinance flattens the columns when only one ticker was requested
+    monkeypatch.setattr(api_service.yf, "download",
+                        lambda **kwargs: _history_df(["AAPL"])["AAPL"])
+    histories = api_service.fetch_bulk_history(["AAPL"])
+    assert "AAPL" in histories
+    assert len(histories["AAPL"]) == 5
+
+
+def test_multi_ticker_history(monkeypatch):
+    monkeypatch.setattr(api_service.yf, "download",
+                        lambda **kwargs: _history_df(["AAPL", "MSFT"]))
+    histories = api_service.fetch_bulk_history(["AAPL", "MSFT"])
+    assert set(histories) == {"AAPL", "MSFT"}
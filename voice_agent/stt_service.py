@@ -1,28 +1,77 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-import speech_recognition as sr
+from faster_whisper import WhisperModel
+import soundfile as sf
+import torch
+import asyncio
+import io
 import logging
 import os
+import orjson
+import queue
 import uuid
-import shutil
-from pydub import AudioSegment  # for converting to wav
 from datetime import datetime
-import json
+from logging.handlers import QueueHandler, QueueListener
 
 # ------------------------------
 # Setup
 # ------------------------------
 app = FastAPI(title="Speech-to-Text (STT) Service")
 
-UPLOAD_DIR = "temp_audio"
 LOG_FILE = "../logs/stt_logs.json"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
-logging.basicConfig(filename=LOG_FILE, level=logging.INFO, format='%(asctime)s %(message)s')
+# Validation table built once at import, checked with one set lookup per request
+_ALLOWED_EXTENSIONS = frozenset({"wav", "mp3", "m4a"})
 
-recognizer = sr.Recognizer()
+# Request handlers only enqueue log records; a background listener owns the
+# file write, so no request ever waits on disk under the logging lock
+_file_handler = logging.FileHandler(LOG_FILE, delay=True)
+_file_handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+_log_queue = queue.Queue(-1)
+_log_listener = QueueListener(_log_queue, _file_handler)
+_log_listener.start()
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(_log_queue)])
+
+# Local Whisper (CTranslate2) — no network round trip per transcription, int8
+# on CPU / FP16 on GPU, loaded once at startup
+_CUDA = torch.cuda.is_available()
+MODEL = WhisperModel(
+    "small.en",
+    device="cuda" if _CUDA else "cpu",
+    compute_type="int8_float16" if _CUDA else "int8",
+)
+
+# ------------------------------
+# Audio Decoding
+# ------------------------------
+def load_audio(buf: io.BytesIO):
+    """
+    Decode the upload in-memory via libsndfile — no ffmpeg subprocess, no
+    intermediate WAV and no temp file. Formats libsndfile can't read (e.g.
+    m4a) fall back to the raw buffer, which faster-whisper decodes through PyAV.
+    """
+    try:
+        data, sample_rate = sf.read(buf, dtype="float32", always_2d=False)
+    except Exception:
+        buf.seek(0)
+        return buf
+    if data.ndim > 1:
+        data = data.mean(axis=1)
+    if sample_rate != 16000:
+        # Whisper wants 16 kHz input; let PyAV resample while decoding
+        buf.seek(0)
+        return buf
+    return data
+
+def run_stt(raw: bytes) -> str:
+    """Decode in-process and transcribe locally with faster-whisper."""
+    audio = load_audio(io.BytesIO(raw))
+    # vad_filter runs Silero VAD inside faster-whisper, so silent stretches
+    # are trimmed before decoding — no separate webrtcvad pass needed
+    segments, _info = MODEL.transcribe(audio, beam_size=1, vad_filter=True)
+    return " ".join(segment.text.strip() for segment in segments)
 
 # ------------------------------
 # Transcription Endpoint
@@ -31,41 +80,29 @@ recognizer = sr.Recognizer()
 async def transcribe_audio(file: UploadFile = File(...)):
     try:
         # Validate file type
-        if not file.filename.endswith((".wav", ".mp3", ".m4a")):
+        ext = (file.filename.rsplit(".", 1)[-1] if "." in file.filename else "").lower()
+        if ext not in _ALLOWED_EXTENSIONS:
             raise HTTPException(status_code=400, detail="Only .wav, .mp3, .m4a files are supported.")
 
-        # Save file temporarily
+        # Read the upload straight into memory — typical voice clips are well
+        # under a megabyte, so the temp-file round trip was pure overhead
         file_id = str(uuid.uuid4())
-        ext = file.filename.rsplit(".", 1)[-1]
-        input_path = os.path.join(UPLOAD_DIR, f"{file_id}.{ext}")
-        with open(input_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        # Convert to WAV if needed
-        if not input_path.endswith(".wav"):
-            wav_path = os.path.join(UPLOAD_DIR, f"{file_id}.wav")
-            audio = AudioSegment.from_file(input_path)
-            audio.export(wav_path, format="wav")
-            os.remove(input_path)
-            input_path = wav_path
-
-        # Transcribe using speech_recognition
-        with sr.AudioFile(input_path) as source:
-            audio_data = recognizer.record(source)
+        raw = await file.read()
 
-        transcription = recognizer.recognize_google(audio_data)
+        # Decode + transcribe are CPU-bound, so run them on a worker thread
+        transcription = await asyncio.to_thread(run_stt, raw)
 
-        # Clean up
-        os.remove(input_path)
+        if not transcription:
+            raise HTTPException(status_code=400, detail="Speech was unintelligible.")
 
-        # Log usage
-        logging.info(json.dumps({
+        # Log usage (orjson serializes the datetime natively)
+        logging.info(orjson.dumps({
             "event": "stt_transcription",
             "filename": file.filename,
             "transcription_id": file_id,
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.utcnow(),
             "transcription_chars": len(transcription)
-        }))
+        }).decode())
 
         return JSONResponse(content={
             "status": "success",
@@ -73,10 +110,8 @@ async def transcribe_audio(file: UploadFile = File(...)):
             "text": transcription
         })
 
-    except sr.UnknownValueError:
-        raise HTTPException(status_code=400, detail="Speech was unintelligible.")
-    except sr.RequestError as e:
-        raise HTTPException(status_code=500, detail=f"Speech recognition error: {e}")
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"STT error: {str(e)}")
         raise HTTPException(status_code=500, detail="Transcription failed.")
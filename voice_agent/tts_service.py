@@ -1,15 +1,22 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.responses import FileResponse, JSONResponse
-from pydantic import BaseModel
-import uuid
+from pydantic import BaseModel, ConfigDict
+from collections import OrderedDict
+import hashlib
+import unicodedata
 import os
+import aiofiles
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 import asyncio
+import socket
 import edge_tts
-from datetime import datetime
+from time import time
 import json
+import orjson
 from fastapi.responses import StreamingResponse
-import traceback # Import traceback for detailed error logging
+from starlette.background import BackgroundTask
 
 # FastAPI app
 app = FastAPI(title="TTS Service (edge-tts)")
@@ -21,18 +28,173 @@ os.makedirs(AUDIO_OUTPUT_DIR, exist_ok=True)
 os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
 # Logging setup
-# Ensure the logger is configured to output to console as well for immediate debugging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler() # Add StreamHandler to see logs in console
-    ]
-)
+# Request handlers only enqueue log records; a background listener owns the
+# file and console writes, so no request ever waits on I/O under the logging
+# lock. Console output is kept for immediate debugging.
+_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+# delay=True defers opening the file until the first record is emitted, so a
+# misconfigured log path costs nothing until logging actually happens
+_file_handler = logging.FileHandler(LOG_FILE, delay=True)
+_file_handler.setFormatter(_formatter)
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(_formatter)
+_log_queue = queue.Queue(-1)
+_log_listener = QueueListener(_log_queue, _file_handler, _stream_handler)
+_log_listener.start()
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(_log_queue)])
+
+# Hot phrases are served straight from RAM — no open()/read() syscalls at
+# all. Bounded by total bytes (not entry count) so one long brief can't
+# blow the budget; least-recently-used entries fall off the front.
+_MEM_CACHE: OrderedDict = OrderedDict()  # key -> raw MP3 bytes
+_MEM_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Payloads up to this size are kept in RAM; anything larger is disk-only so a
+# single long brief can't evict the whole hot set
+_INMEM_THRESHOLD = 1 * 1024 * 1024
+
+# Disk persistence can be switched off (TTS_DISK_CACHE=0) to run RAM-only —
+# small responses then never touch the filesystem at all
+_DISK_CACHE_ENABLED = os.getenv("TTS_DISK_CACHE", "1") != "0"
+
+# Content-addressed files never expire on their own, so the audio directory
+# is LRU-bounded too: oldest entries are unlinked once the total size passes
+# the budget, keeping the fast path from degrading into ENOSPC stalls
+_MAX_DISK_BYTES = int(os.getenv("TTS_MAX_DISK_BYTES", str(1 << 30)))
+_disk_index: OrderedDict = OrderedDict()  # key -> file size
+_disk_bytes = 0
+
+
+def _scan_disk_cache():
+    """Rebuild the disk-cache index from the audio directory, oldest first."""
+    global _disk_bytes
+    entries = []
+    for name in os.listdir(AUDIO_OUTPUT_DIR):
+        if not name.endswith(".mp3"):
+            continue
+        try:
+            stat = os.stat(os.path.join(AUDIO_OUTPUT_DIR, name))
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, name[:-4], stat.st_size))
+    for _, key, size in sorted(entries):
+        _disk_index[key] = size
+        _disk_bytes += size
+
+
+_scan_disk_cache()
+
+
+def _disk_cache_touch(key: str):
+    if key in _disk_index:
+        _disk_index.move_to_end(key)
+
+
+def _disk_cache_record(key: str, size: int):
+    global _disk_bytes
+    if key in _disk_index:
+        _disk_index.move_to_end(key)
+        return
+    _disk_index[key] = size
+    _disk_bytes += size
+    while _disk_bytes > _MAX_DISK_BYTES and _disk_index:
+        old_key, old_size = _disk_index.popitem(last=False)
+        _disk_bytes -= old_size
+        try:
+            os.unlink(os.path.join(AUDIO_OUTPUT_DIR, f"{old_key}.mp3"))
+        except OSError:
+            pass
+
+# edge-tts yields many tiny audio chunks; coalescing them to ~64 KB before
+# yielding cuts the ASGI send count (and its framing overhead) by 10-100x.
+# The first slice goes out at ~10 KB so playback can start as soon as a
+# small bunch of audio exists instead of waiting for a full 64 KB window
+_STREAM_BUF_LIMIT = 64 * 1024
+_STREAM_FIRST_LIMIT = 10 * 1024
+
+# Cap in-flight upstream synthesis calls — beyond a handful, edge-tts starts
+# serializing or timing out, so excess requests queue here instead
+_TTS_SEM = asyncio.Semaphore(int(os.getenv("TTS_MAX_CONCURRENCY", "8")))
+
+# Single-flight: concurrent requests for the same (voice, text) await the
+# first synthesis's bytes instead of each opening an upstream stream
+_INFLIGHT: dict = {}
+_mem_cache_bytes = 0
+_mem_cache_lock = asyncio.Lock()
+
+
+async def _mem_cache_get(key: str):
+    async with _mem_cache_lock:
+        blob = _MEM_CACHE.get(key)
+        if blob is not None:
+            _MEM_CACHE.move_to_end(key)
+        return blob
+
+
+async def _mem_cache_put(key: str, blob: bytes):
+    global _mem_cache_bytes
+    async with _mem_cache_lock:
+        if key in _MEM_CACHE:
+            return
+        _MEM_CACHE[key] = blob
+        _mem_cache_bytes += len(blob)
+        while _mem_cache_bytes > _MEM_CACHE_MAX_BYTES:
+            _, evicted = _MEM_CACHE.popitem(last=False)
+            _mem_cache_bytes -= len(evicted)
+
+
+# An unknown voice only fails after the whole upstream stream has run and
+# returned No-Audio-Received; validating against the published voice list
+# rejects it in O(1) before any network or cache work happens
+_VOICES_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "voices_cache.json")
+
+
+def _load_cached_voices() -> frozenset:
+    try:
+        with open(_VOICES_CACHE_PATH) as f:
+            return frozenset(json.load(f))
+    except Exception:
+        return frozenset()
+
+
+VALID_VOICES = _load_cached_voices()
+
+
+@app.on_event("startup")
+async def _prime_dns():
+    # edge-tts opens a fresh WebSocket per synthesis and does not take an
+    # external session, so the handshake can't be pooled — but resolving the
+    # speech endpoint once here warms the OS resolver cache, shaving the DNS
+    # lookup off the first (and post-TTL) requests
+    try:
+        await asyncio.get_running_loop().getaddrinfo(
+            "speech.platform.bing.com", 443, type=socket.SOCK_STREAM
+        )
+    except OSError as e:
+        logging.warning(f"DNS pre-resolution failed: {e}")
+
+
+@app.on_event("startup")
+async def _refresh_voice_list():
+    global VALID_VOICES
+    if VALID_VOICES:
+        return
+    try:
+        voices = await edge_tts.list_voices()
+        VALID_VOICES = frozenset(v["ShortName"] for v in voices)
+        with open(_VOICES_CACHE_PATH, "w") as f:
+            json.dump(sorted(VALID_VOICES), f)
+    except Exception as e:
+        # Without a voice list we fall back to letting edge-tts reject voices
+        logging.warning(f"Could not fetch edge-tts voice list: {e}")
+
 
 # Request model
 class TTSRequest(BaseModel):
+    # pydantic-core strips and length-checks the text during validation (in
+    # Rust), so the handler never needs its own strip()/empty-text branch
+    model_config = ConfigDict(str_strip_whitespace=True, str_min_length=1)
+
     text: str
     voice: str = "en-US-AriaNeural"  # default voice
 
@@ -40,78 +202,133 @@ class TTSRequest(BaseModel):
 @app.post("/speak")
 async def speak_text(data: TTSRequest):
     try:
-        text = data.text.strip()
-        
+        text = data.text  # already stripped and non-empty via model validation
+
         logging.info(f"Received TTS request for text (first 100 chars): '{text[:100]}...' with voice: '{data.voice}'")
 
-        if not text:
-            logging.warning("Received empty text input for TTS.")
-            raise HTTPException(status_code=400, detail="Text input cannot be empty.")
+        if VALID_VOICES and data.voice not in VALID_VOICES:
+            raise HTTPException(status_code=400, detail=f"Unknown voice: {data.voice}")
 
-        file_id = str(uuid.uuid4())
-        filename = f"{file_id}.mp3"
-        output_path = os.path.join(AUDIO_OUTPUT_DIR, filename)
+        # Content-addressed cache: the same (voice, text) pair always maps to
+        # the same file, so repeated phrases skip the edge-tts round trip —
+        # the dominant cost of this endpoint — entirely. The key is computed
+        # over NFC-normalized, whitespace-collapsed text so trailing spaces or
+        # alternative Unicode encodings of the same phrase share one entry;
+        # synthesis still gets the text as submitted
+        norm = " ".join(unicodedata.normalize("NFC", text).split())
+        key = hashlib.sha256(f"{data.voice}\x00{norm}".encode()).hexdigest()
+        output_path = os.path.join(AUDIO_OUTPUT_DIR, f"{key}.mp3")
 
-        # Initialize byte counter to check if any data was written
-        bytes_written = 0
+        blob = await _mem_cache_get(key)
+        if blob is not None:
+            return Response(content=blob, media_type="audio/mpeg")
 
-        try:
-            communicate = edge_tts.Communicate(text, voice=data.voice)
-
-            # Generate MP3 file
-            logging.info(f"Attempting to write audio to: {output_path}")
-            with open(output_path, "wb") as f:
-                async for chunk in communicate.stream():
-                    if chunk["type"] == "audio":
-                        f.write(chunk["data"])
-                        bytes_written += len(chunk["data"])
-                    elif chunk["type"] == "No-Audio-Received":
-                        logging.error(f"Edge TTS returned 'No-Audio-Received' for text: '{text[:50]}...' Voice: {data.voice}")
-                        # This chunk type indicates a specific failure from the TTS service
-                        raise ValueError("Edge TTS service did not return audio data.")
-                    else:
-                        logging.debug(f"Received non-audio chunk type: {chunk['type']}")
-            
-            if bytes_written == 0:
-                logging.error(f"No audio data was written to file: {output_path}. Text length: {len(text)}. Voice: {data.voice}")
-                raise RuntimeError("TTS generation completed but no audio data was produced.")
-
-            logging.info(f"Successfully wrote {bytes_written} bytes to {output_path}")
-
-        except FileNotFoundError:
-            logging.error(f"File system error: Output directory '{AUDIO_OUTPUT_DIR}' or path '{output_path}' not found or accessible.", exc_info=True)
-            raise HTTPException(status_code=500, detail="Server file system error during audio generation.")
-        except PermissionError:
-            logging.error(f"Permission denied: Cannot write to '{output_path}'. Check directory permissions.", exc_info=True)
-            raise HTTPException(status_code=500, detail="Server permission error during audio generation.")
-        except Exception as e:
-            # Catch specific edge_tts related errors here if possible, or general for now
-            logging.error(f"Error during edge_tts communication or file writing: {str(e)}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"TTS audio generation failed: {str(e)}")
-
-
-        # Log event
-        logging.info(json.dumps({
-            "event": "tts_generation",
-            "timestamp": datetime.utcnow().isoformat(),
-            "input_chars": len(text),
-            "voice": data.voice,
-            "output_file": output_path,
-            "bytes_generated": bytes_written
-        }))
-
-        def iter_audio():
-            with open(output_path, "rb") as f:
-                yield from f
-
-        return StreamingResponse(iter_audio(), media_type="audio/mpeg")
+        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            logging.info(f"TTS cache hit for key {key[:12]}")
+            _disk_cache_touch(key)
+            # FileResponse lets Starlette use os.sendfile — a zero-copy kernel
+            # path with no Python-level iteration per block
+            return FileResponse(output_path, media_type="audio/mpeg",
+                                filename=f"{key}.mp3")
+
+        # Duplicate concurrent requests collapse onto the first one's synthesis
+        inflight = _INFLIGHT.get(key)
+        if inflight is not None:
+            blob = await inflight
+            if blob:
+                return Response(content=blob, media_type="audio/mpeg")
+            raise HTTPException(status_code=502, detail="TTS synthesis failed.")
+
+        # Stream straight from edge-tts to the client: playback can begin at
+        # the first upstream chunk instead of after full synthesis. Bytes are
+        # teed into a buffer and the cache is filled once the response ends,
+        # so the disk write never sits on the request path.
+        communicate = edge_tts.Communicate(text, voice=data.voice)
+        audio_buf = bytearray()
+        state = {"complete": False}
+
+        # Registered last so nothing can raise between here and the response
+        # being returned — iter_audio's finally always resolves the future
+        fut = asyncio.get_running_loop().create_future()
+        _INFLIGHT[key] = fut
+
+        async def iter_audio():
+            pending = bytearray()
+            flush_at = _STREAM_FIRST_LIMIT
+            try:
+                async with _TTS_SEM:
+                    async for chunk in communicate.stream():
+                        if chunk["type"] == "audio":
+                            audio_buf += chunk["data"]
+                            pending += chunk["data"]
+                            if len(pending) >= flush_at:
+                                yield bytes(pending)
+                                pending.clear()
+                                flush_at = _STREAM_BUF_LIMIT
+                        elif chunk["type"] == "No-Audio-Received":
+                            # Specific failure from the TTS service mid-stream;
+                            # the response has already started so all we can do
+                            # is stop
+                            logging.error(f"Edge TTS returned 'No-Audio-Received' for text: '{text[:50]}...' Voice: {data.voice}")
+                            return
+                        else:
+                            logging.debug(f"Received non-audio chunk type: {chunk['type']}")
+                state["complete"] = True
+                if pending:
+                    yield bytes(pending)
+            finally:
+                # Starlette skips the background task when a streaming body
+                # raises, so the single-flight future must be settled here —
+                # an unresolved future would hang every later request for this
+                # key. Waiters get the full bytes on success, empty on failure.
+                if not fut.done():
+                    fut.set_result(bytes(audio_buf) if state["complete"] else b"")
+                _INFLIGHT.pop(key, None)
+
+        async def fill_cache():
+            # A disconnect or mid-stream failure leaves the buffer partial;
+            # never cache it (the future was already settled by iter_audio)
+            blob = bytes(audio_buf) if state["complete"] else b""
+            if not blob:
+                logging.error(f"No audio data was produced for key {key[:12]}. Text length: {len(text)}. Voice: {data.voice}")
+                return
+            if _DISK_CACHE_ENABLED:
+                # Single-flight guarantees one writer per key, so a fixed
+                # temp name is safe; the atomic rename means readers never
+                # see a partial file
+                tmp_path = f"{output_path}.tmp"
+                # aiofiles pushes the write syscalls to a worker thread, so
+                # other in-flight TTS streams keep progressing during disk I/O
+                async with aiofiles.open(tmp_path, "wb") as f:
+                    await f.write(blob)
+                os.replace(tmp_path, output_path)
+                # Eviction runs here, already off the request path
+                _disk_cache_record(key, len(blob))
+            if len(blob) <= _INMEM_THRESHOLD:
+                await _mem_cache_put(key, blob)
+
+            # Log event (skip serializing entirely if INFO is disabled;
+            # orjson encodes several times faster than stdlib json)
+            if logging.getLogger().isEnabledFor(logging.INFO):
+                logging.info(orjson.dumps({
+                    "event": "tts_generation",
+                    # Epoch float: no deprecated utcnow(), no datetime
+                    # allocation and no strftime pass per record
+                    "timestamp": time(),
+                    "input_chars": len(text),
+                    "voice": data.voice,
+                    "output_file": output_path,
+                    "bytes_generated": len(blob)
+                }).decode())
+
+        return StreamingResponse(iter_audio(), media_type="audio/mpeg",
+                                 background=BackgroundTask(fill_cache))
 
     except HTTPException:
         # Re-raise HTTPExceptions directly so FastAPI handles them
         raise
-    except Exception as e:
-        # Catch any other unexpected errors at the top level
-        logging.error(f"Unhandled exception in /speak endpoint: {str(e)}", exc_info=True)
+    except Exception:
+        logging.exception("Unhandled exception in /speak endpoint")
         raise HTTPException(status_code=500, detail="An unexpected server error occurred.")
 
 # GET /health